@@ -12,9 +12,10 @@ Tính năng mới:
 """
 
 from __future__ import annotations
-import sys, os, time, json, socket, platform
+import sys, os, time, json, socket, platform, threading, ipaddress, functools
 from typing import Any, Dict, List, Optional, Tuple
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # ---- deps ----
@@ -29,13 +30,22 @@ try:
 except Exception:
     requests = None
 
+try:
+    import orjson  # optional: faster JSON encoding for export
+except Exception:
+    orjson = None
+
 from PySide6 import QtCore, QtGui, QtWidgets
+import numpy as np
 from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 APP_VERSION = "2.2.0 GUI-PRO"
 BRAND_NAME  = "IT Inspector"
 
+# bound once: compared on every connection / address row
+_AF_INET = socket.AF_INET; _AF_INET6 = socket.AF_INET6; _SOCK_STREAM = socket.SOCK_STREAM
+
 # ------------- utils / collectors -------------
 def human(n: Optional[float]) -> str:
     if n is None: return "N/A"
@@ -45,49 +55,146 @@ def human(n: Optional[float]) -> str:
         n /= 1024
     return f"{n:.1f}EB"
 
+def dumps_json(o: Any) -> bytes:
+    """UTF-8 JSON with indent 2; uses orjson when available, stdlib otherwise."""
+    if orjson is not None:
+        return orjson.dumps(o, option=orjson.OPT_INDENT_2|orjson.OPT_NON_STR_KEYS)
+    return json.dumps(o, ensure_ascii=False, indent=2).encode("utf-8")
+
+@functools.lru_cache(maxsize=8192)
 def is_private_ip(ip: str) -> bool:
+    # fast path for the common private IPv4 / link-local IPv6 prefixes
+    if ip.startswith(("10.", "127.", "192.168.", "fe80:")): return True
+    if ip.startswith("172."):
+        second = ip[4:7].partition(".")[0]
+        if second.isdigit() and 16 <= int(second) <= 31: return True
     try:
-        import ipaddress
         return ipaddress.ip_address(ip).is_private
     except Exception:
         return False
 
-_geo_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
+# LRU order: oldest first; bounded so the QSettings "geo_cache" blob stays small
+_geo_cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
 _GEO_TTL = 3600.0
+_GEO_MAX = 2048
+_GEO_FIELDS = ("country","regionName","city","isp","org","as","query")
+# lookups run in the background; geoip() never waits on the network
+_geo_lock = threading.Lock()
+_geo_pending: set[str] = set()
+_geo_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geoip")
+
+_GEO_BATCH = 100  # ip-api /batch accepts at most 100 IPs per request
+GEO_EXPORT_WAIT = 6.0  # seconds export_json waits for lookups (one /batch request times out at 5 s)
+
+def _geo_put(ip: str, d: Dict[str, Any], ts: float) -> None:
+    # caller holds _geo_lock
+    _geo_cache[ip] = (d, ts)
+    _geo_cache.move_to_end(ip)
+    while len(_geo_cache) > _GEO_MAX:
+        _geo_cache.popitem(last=False)
+
+def _geo_get(ip: str, now: float) -> Optional[Dict[str, Any]]:
+    # caller holds _geo_lock; expired entries are dropped, hits become most recent
+    hit = _geo_cache.get(ip)
+    if hit is None: return None
+    if now - hit[1] >= _GEO_TTL:
+        del _geo_cache[ip]; return None
+    _geo_cache.move_to_end(ip)
+    return hit[0]
+
+def _fetch_geo_batch(ips: List[str]) -> None:
+    try:
+        r = requests.post("http://ip-api.com/batch",
+                          json=[{"query":ip,"fields":f"status,{','.join(_GEO_FIELDS)}"} for ip in ips], timeout=5)
+        now = time.time()
+        for ip, j in zip(ips, r.json()):
+            if j.get("status") == "success":
+                d = {k:j.get(k) for k in _GEO_FIELDS}
+                with _geo_lock: _geo_put(ip, d, now)
+    except Exception:
+        pass
+    finally:
+        with _geo_lock: _geo_pending.difference_update(ips)
+
+def _geo_submit(ips: List[str]) -> None:
+    try:
+        _geo_pool.submit(_fetch_geo_batch, ips)
+    except RuntimeError:  # pool already shut down (app closing)
+        with _geo_lock: _geo_pending.difference_update(ips)
+
+def geo_prefetch(ips) -> None:
+    """Queue every uncached public IP as background /batch requests (up to 100 IPs each)."""
+    if requests is None: return
+    now = time.time()
+    todo: List[str] = []
+    with _geo_lock:
+        for ip in ips:
+            if not ip or ip in _geo_pending or is_private_ip(ip): continue
+            if _geo_get(ip, now) is not None: continue
+            _geo_pending.add(ip); todo.append(ip)
+    for i in range(0, len(todo), _GEO_BATCH):
+        _geo_submit(todo[i:i+_GEO_BATCH])
+
+def geo_resolve(ips, timeout: float) -> None:
+    """Blocking variant for exports: queue the lookups and wait (up to timeout) until they finish."""
+    ips = set(ips)
+    geo_prefetch(ips)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with _geo_lock:
+            if _geo_pending.isdisjoint(ips): return
+        time.sleep(0.05)
 
 def geoip(ip: str) -> Optional[Dict[str, Any]]:
+    """Return cached Geo/ISP info, or None after queueing the IP for a background lookup."""
     if not ip or ip=="127.0.0.1" or is_private_ip(ip) or requests is None:
         return None
     now = time.time()
-    if ip in _geo_cache and now - _geo_cache[ip][1] < _GEO_TTL:
-        return _geo_cache[ip][0]
+    with _geo_lock:
+        hit = _geo_get(ip, now)
+        if hit is not None:
+            return hit
+        if ip in _geo_pending:
+            return None
+        _geo_pending.add(ip)
+    _geo_submit([ip])
+    return None
+
+def geo_cache_dump() -> str:
+    now = time.time()
+    with _geo_lock:
+        return json.dumps({ip:[d,ts] for ip,(d,ts) in _geo_cache.items() if now - ts < _GEO_TTL}, ensure_ascii=False)
+
+def geo_cache_load(raw: str) -> None:
+    now = time.time()
     try:
-        r = requests.get(f"http://ip-api.com/json/{ip}?fields=status,country,regionName,city,isp,org,as,query", timeout=2.5)
-        j = r.json()
-        if j.get("status") == "success":
-            d = {k:j.get(k) for k in ("country","regionName","city","isp","org","as","query")}
-            _geo_cache[ip] = (d, now)
-            return d
+        data = json.loads(raw or "{}")
+        with _geo_lock:
+            # oldest first, so the LRU bound keeps the freshest entries
+            for ip,(d,ts) in sorted(data.items(), key=lambda kv: kv[1][1]):
+                if now - ts < _GEO_TTL: _geo_put(ip, d, ts)
     except Exception:
         pass
-    return None
+
+# static for the lifetime of the process, computed once at import
+_SYS_INFO_STATIC: Dict[str, Any] = {
+    "brand": BRAND_NAME,
+    "version": APP_VERSION,
+    "hostname": platform.node(),
+    "platform": platform.system(),
+    "release": platform.release(),
+    "arch": platform.machine(),
+    "python": platform.python_version(),
+}
 
 def sys_info() -> Dict[str, Any]:
-    return {
-        "brand": BRAND_NAME,
-        "version": APP_VERSION,
-        "hostname": platform.node(),
-        "platform": platform.system(),
-        "release": platform.release(),
-        "arch": platform.machine(),
-        "python": platform.python_version(),
-        "timestamp": datetime.utcnow().isoformat()+"Z",
-    }
+    return {**_SYS_INFO_STATIC, "timestamp": datetime.utcnow().isoformat()+"Z"}
 
 def res_usage() -> Dict[str, Any]:
-    try: cpu_percent = psutil.cpu_percent(interval=0.2)
+    # non-blocking: delta since the previous call (primed in MainWindow.__init__)
+    try: cpu_percent = psutil.cpu_percent(interval=None)
     except Exception: cpu_percent = 0.0
-    try: per_core = psutil.cpu_percent(interval=0.1, percpu=True)
+    try: per_core = psutil.cpu_percent(interval=None, percpu=True)
     except Exception: per_core = []
     try: vm = psutil.virtual_memory()
     except Exception: vm = None
@@ -121,7 +228,7 @@ def net_ifaces() -> List[Dict[str, Any]]:
         for name,lst in addrs.items():
             ips=[]
             for a in lst:
-                fam="IPv4" if a.family==socket.AF_INET else "IPv6" if a.family==socket.AF_INET6 else None
+                fam="IPv4" if a.family==_AF_INET else "IPv6" if a.family==_AF_INET6 else None
                 if fam: ips.append({"family":fam,"address":a.address,"netmask":a.netmask})
             st=stats.get(name)
             out.append({"name":name,"is_up":bool(getattr(st,"isup",False)) if st else None,
@@ -129,44 +236,92 @@ def net_ifaces() -> List[Dict[str, Any]]:
     except Exception: pass
     return out
 
-def net_conns(do_geo=False) -> List[Dict[str, Any]]:
+def net_conns(do_geo=False, conns=None) -> List[Dict[str, Any]]:
     out=[]
     try:
-        for c in psutil.net_connections(kind="inet"):
+        if conns is None: conns=psutil.net_connections(kind="inet")
+        names: Dict[Optional[int], Optional[str]] = {}  # one Process() per PID, not per socket
+        if do_geo:
+            # one batched lookup for all unseen remotes instead of one HTTP call per row
+            geo_prefetch({c.raddr.ip for c in conns if c.raddr})
+        for c in conns:
             l = f"{c.laddr.ip}:{c.laddr.port}" if c.laddr else ""
             r = f"{c.raddr.ip}:{c.raddr.port}" if c.raddr else ""
             pid=c.pid
-            try: proc=psutil.Process(pid).name() if pid else None
-            except Exception: proc=None
-            g=None
-            if do_geo and r:
-                host,_,_=r.rpartition(":")
-                g = geoip(host)
-            out.append({"proto":"tcp" if c.type==socket.SOCK_STREAM else "udp","local":l,"remote":r,
+            if pid in names: proc=names[pid]
+            else:
+                try: proc=psutil.Process(pid).name() if pid else None
+                except Exception: proc=None
+                names[pid]=proc
+            g = geoip(c.raddr.ip) if do_geo and c.raddr else None
+            out.append({"proto":"tcp" if c.type==_SOCK_STREAM else "udp","local":l,"remote":r,
                         "state":getattr(c,"status",None),"pid":pid,"process":proc,"geo":g})
     except Exception: pass
     return out
 
-def top_by_conns(limit=20) -> List[Dict[str, Any]]:
+def top_by_conns(limit=20, conns=None) -> List[Dict[str, Any]]:
     res=[]
     try:
+        if conns is None: conns=psutil.net_connections(kind="inet")
         counts=defaultdict(int)
-        for c in psutil.net_connections(kind="inet"):
+        for c in conns:
             if c.pid: counts[c.pid]+=1
         for pid,cnt in sorted(counts.items(), key=lambda kv:-kv[1])[:limit]:
             name=cmd=None
             try:
-                p=psutil.Process(pid); name=p.name(); cmd=" ".join(p.cmdline())
+                p=psutil.Process(pid)
+                with p.oneshot():
+                    name=p.name(); cmd=" ".join(p.cmdline())
             except Exception: pass
             res.append({"pid":pid,"name":name,"cmd":cmd,"conns":cnt})
     except Exception: pass
     return res
 
-def snapshot(do_geo=False) -> Dict[str, Any]:
+def snapshot(do_geo=False, geo_wait=0.0) -> Dict[str, Any]:
+    # read /proc/net/* (or the OS equivalent) once and share it between both consumers
+    try: conns=psutil.net_connections(kind="inet")
+    except Exception: conns=[]
+    if do_geo and geo_wait > 0:
+        geo_resolve({c.raddr.ip for c in conns if c.raddr}, geo_wait)
     return {"system":sys_info(),"resources":res_usage(),"interfaces":net_ifaces(),
-            "connections":net_conns(do_geo=do_geo),"top":top_by_conns()}
+            "connections":net_conns(do_geo=do_geo, conns=conns),"top":top_by_conns(conns=conns)}
+
+def stream_conns_csv(path: str) -> None:
+    """Write net_connections straight to CSV row by row, without snapshot() or intermediate dicts."""
+    import csv
+    names: Dict[int, Optional[str]] = {}
+    with open(path,"w",newline="",encoding="utf-8") as f:
+        w=csv.writer(f); w.writerow(["proto","local","remote","state","process","pid"])
+        for c in psutil.net_connections(kind="inet"):
+            pid=c.pid
+            if pid and pid not in names:
+                try: names[pid]=psutil.Process(pid).name()
+                except Exception: names[pid]=None
+            w.writerow(["tcp" if c.type==_SOCK_STREAM else "udp",
+                        f"{c.laddr.ip}:{c.laddr.port}" if c.laddr else "",
+                        f"{c.raddr.ip}:{c.raddr.port}" if c.raddr else "",
+                        getattr(c,"status",None), names.get(pid) if pid else None, pid])
+
+# ------------- background worker -------------
+class SnapshotSignals(QtCore.QObject):
+    done=QtCore.Signal(object)  # object: avoids converting the dict to a QVariantMap
+
+class SnapshotTask(QtCore.QRunnable):
+    """Run snapshot() on the QThreadPool and hand the result back to the GUI thread via a signal."""
+    def __init__(self, do_geo:bool=False):
+        super().__init__()
+        self.setAutoDelete(False)  # MainWindow keeps a reference until done fires
+        self.do_geo=do_geo
+        self.signals=SnapshotSignals()
+
+    def run(self):
+        try: snap=snapshot(do_geo=self.do_geo)
+        except Exception: snap={}
+        self.signals.done.emit(snap)
 
 # ------------- charts -------------
+HISTORY = 60  # samples kept per MiniChart
+
 class MiniChart(FigureCanvas):
     def __init__(self, title:str, ylim:Tuple[float,float]|None=None):
         self.fig=Figure(figsize=(4,2), dpi=100)
@@ -174,15 +329,46 @@ class MiniChart(FigureCanvas):
         self.ax=self.fig.add_subplot(111)
         self.ax.set_title(title, fontsize=9)
         self.ax.grid(True, alpha=0.25)
-        if ylim: self.ax.set_ylim(*ylim)
-        (self.line,) = self.ax.plot([], [], linewidth=1.6)
-        self.y=deque(maxlen=60)
+        self._fixed_y = ylim is not None
+        self.ax.set_ylim(*(ylim or (0,1)))
+        # animated: line is left out of the full render and blitted on top of the cached background
+        (self.line,) = self.ax.plot([], [], linewidth=1.6, animated=True)
+        # preallocated ring buffer: newest sample always at _y[-1], _n valid points
+        self._y=np.zeros(HISTORY, dtype=np.float32); self._n=0
+        self._x=np.arange(HISTORY, dtype=np.float32)
+        self._bg=None; self._full=False
+        self.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self._bg=self.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def set_data(self, v:float):
+        """Update buffer/line/limits only; drawing is deferred to flush()."""
+        self._y[:-1]=self._y[1:]; self._y[-1]=v
+        self._n=n=min(self._n+1, HISTORY)
+        self.line.set_data(self._x[:n], self._y[-n:])
+        xmax=max(10,n)
+        if self.ax.get_xlim()[1]!=xmax:
+            self.ax.set_xlim(0, xmax); self._full=True
+        if not self._fixed_y:
+            top=float(self._y[-n:].max()); hi=self.ax.get_ylim()[1]
+            if top>hi or top<hi*0.25:
+                new_hi=max(1.0, top*1.2)
+                if new_hi!=hi:  # an idle (all-zero) chart stays at 1.0 and keeps blitting
+                    self.ax.set_ylim(0, new_hi); self._full=True
+
+    def flush(self):
+        if self._full or self._bg is None:
+            # axes/ticks changed -> full render, _on_draw recaptures the background
+            self._full=False
+            self.draw_idle(); return
+        self.restore_region(self._bg)
+        self.ax.draw_artist(self.line)
+        self.blit(self.ax.bbox)
 
     def push(self, v:float):
-        self.y.append(v)
-        self.line.set_data(range(len(self.y)), list(self.y))
-        self.ax.set_xlim(0, max(10,len(self.y)))
-        self.draw_idle()
+        self.set_data(v); self.flush()
 
 # ------------- dialogs -------------
 class PidDetailDialog(QtWidgets.QDialog):
@@ -201,19 +387,22 @@ class PidDetailDialog(QtWidgets.QDialog):
     def load(self, pid:int):
         try:
             p=psutil.Process(pid)
-            info={
-                "pid": pid,
-                "name": p.name(),
-                "exe": p.exe() if p else "",
-                "cmdline": " ".join(p.cmdline()),
-                "cwd": p.cwd() if p else "",
-                "username": p.username(),
-                "cpu_percent": p.cpu_percent(interval=0.1),
-                "memory_percent": round(p.memory_percent(),2),
-                "create_time": datetime.fromtimestamp(p.create_time()).isoformat(),
-                "status": p.status(),
-                "ppid": p.ppid(),
-            }
+            # cpu_percent needs two fresh samples, so take it outside oneshot's cache
+            cpu=p.cpu_percent(interval=0.1)
+            with p.oneshot():
+                info={
+                    "pid": pid,
+                    "name": p.name(),
+                    "exe": p.exe() if p else "",
+                    "cmdline": " ".join(p.cmdline()),
+                    "cwd": p.cwd() if p else "",
+                    "username": p.username(),
+                    "cpu_percent": cpu,
+                    "memory_percent": round(p.memory_percent(),2),
+                    "create_time": datetime.fromtimestamp(p.create_time()).isoformat(),
+                    "status": p.status(),
+                    "ppid": p.ppid(),
+                }
             # open files
             files=[]
             try:
@@ -226,11 +415,11 @@ class PidDetailDialog(QtWidgets.QDialog):
                 for c in p.connections(kind="inet"):
                     l=f"{c.laddr.ip}:{c.laddr.port}" if c.laddr else ""
                     r=f"{c.raddr.ip}:{c.raddr.port}" if c.raddr else ""
-                    conns.append({"proto":"tcp" if c.type==socket.SOCK_STREAM else "udp","local":l,"remote":r,"state":getattr(c,"status","")})
+                    conns.append({"proto":"tcp" if c.type==_SOCK_STREAM else "udp","local":l,"remote":r,"state":getattr(c,"status","")})
             except Exception: pass
 
             dump={"process":info,"open_files":files,"connections":conns}
-            self.txt.setPlainText(json.dumps(dump, ensure_ascii=False, indent=2))
+            self.txt.setPlainText(dumps_json(dump).decode("utf-8"))
         except Exception as e:
             self.txt.setPlainText(f"Error: {e}")
 
@@ -300,13 +489,23 @@ class MainWindow(QtWidgets.QMainWindow):
         self.btnExportJson.clicked.connect(self.export_json)
         self.btnExportCsv.clicked.connect(self.export_csv)
         self.btnDark.clicked.connect(self.toggle_dark)
-        self.qSearch.textChanged.connect(self.refresh); self.qPort.textChanged.connect(self.refresh)
-        self.qProc.textChanged.connect(self.refresh); self.qState.currentIndexChanged.connect(self.refresh)
+        self.qSearch.textChanged.connect(self.refilter); self.qPort.textChanged.connect(self.refilter)
+        self.qProc.textChanged.connect(self.refilter); self.qState.currentIndexChanged.connect(self.refilter)
         self.spinSec.valueChanged.connect(lambda v: self.timer.setInterval(v*1000))
         self.chkAuto.toggled.connect(lambda on: self.timer.start(self.spinSec.value()*1000) if on else self.timer.stop())
 
         # state
         self.last_tx=0; self.last_rx=0
+        self._busy=False; self._task=None
+        self._last_snap:Optional[Dict[str,Any]]=None
+        # a bit under spinSec's 1 s minimum so QTimer jitter never drops a regular tick
+        self._last_snap_ts=0.0; self._min_interval=0.9
+        self._ifaces_sig:Optional[tuple]=None
+        self._kill_btns:Dict[QtWidgets.QTableWidget,List[QtWidgets.QPushButton]]={}
+        self._det_btns:Dict[QtWidgets.QTableWidget,List[QtWidgets.QPushButton]]={}
+        try:
+            psutil.cpu_percent(interval=None); psutil.cpu_percent(interval=None, percpu=True)
+        except Exception: pass
         self.load_settings()
         QtCore.QTimer.singleShot(200, self.refresh)
 
@@ -316,6 +515,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.spinSec.setValue(self.settings.value("interval", 3, type=int))
         self.chkGeo.setChecked(self.settings.value("geo", False, type=bool))
         self.chkKill.setChecked(self.settings.value("kill", False, type=bool))
+        geo_cache_load(self.settings.value("geo_cache", "", type=str))
         if self.settings.value("dark", False, type=bool):
             self.apply_dark(True)
         self.timer.setInterval(self.spinSec.value()*1000)
@@ -326,10 +526,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.settings.setValue("interval", self.spinSec.value())
         self.settings.setValue("geo", self.chkGeo.isChecked())
         self.settings.setValue("kill", self.chkKill.isChecked())
+        self.settings.setValue("geo_cache", geo_cache_dump())
         self.settings.setValue("dark", self._dark if hasattr(self, "_dark") else False)
 
     def closeEvent(self, e: QtGui.QCloseEvent) -> None:
         self.save_settings()
+        # drop queued /batch lookups so quitting doesn't wait on the network
+        _geo_pool.shutdown(wait=False, cancel_futures=True)
         super().closeEvent(e)
 
     def apply_dark(self, on: bool):
@@ -357,20 +560,44 @@ class MainWindow(QtWidgets.QMainWindow):
         self.save_settings()
 
     def toggle_visible(self):
+        if self.isVisible():
+            # hidden to tray -> stop polling; showEvent resumes it
+            self.timer.stop()
         self.setVisible(not self.isVisible())
 
+    def showEvent(self, e: QtGui.QShowEvent) -> None:
+        super().showEvent(e)
+        if self.chkAuto.isChecked() and not self.timer.isActive():
+            self.timer.start()
+            self.refresh()
+
     # ---------- helpers ----------
-    def set_table(self, tbl:QtWidgets.QTableWidget, rows:List[List[Any]]):
-        tbl.setRowCount(len(rows))
-        for r,row in enumerate(rows):
+    def set_table(self, tbl:QtWidgets.QTableWidget, rows:List[List[Any]], pids:List[Optional[int]]):
+        """Incremental table update: only cells whose text changed are rewritten; Kill/Detail buttons
+        come from a per-row pool and are only created when the table grows."""
+        n=len(rows)
+        kills=self._kill_btns.setdefault(tbl, []); dets=self._det_btns.setdefault(tbl, [])
+        if tbl.rowCount()!=n:
+            tbl.setRowCount(n)
+            # Qt deletes cell widgets of removed rows -> drop them from the pool
+            del kills[n:]; del dets[n:]
+        kc=tbl.columnCount()-2; dc=kc+1
+        kill_on=self.chkKill.isChecked()
+        for r,(row,pid) in enumerate(zip(rows,pids)):
             for c,val in enumerate(row):
-                if isinstance(val, QtWidgets.QWidget):
-                    tbl.setCellWidget(r,c,val)
+                s=str(val); it=tbl.item(r,c)
+                if it is not None and it.text()==s: continue
+                if it is None:
+                    it=QtWidgets.QTableWidgetItem(s); tbl.setItem(r,c,it)
                 else:
-                    it=QtWidgets.QTableWidgetItem(str(val))
-                    if isinstance(val,(int,float)):
-                        it.setTextAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter)
-                    tbl.setItem(r,c,it)
+                    it.setText(s)
+                if isinstance(val,(int,float)):
+                    it.setTextAlignment(QtCore.Qt.AlignRight|QtCore.Qt.AlignVCenter)
+            if r>=len(kills):
+                kills.append(self.btn_kill()); dets.append(self.btn_detail())
+                tbl.setCellWidget(r,kc,kills[r]); tbl.setCellWidget(r,dc,dets[r])
+            kills[r].setProperty("pid", pid); dets[r].setProperty("pid", pid)
+            kills[r].setEnabled(kill_on and pid is not None)
 
     def iface_text(self, interfaces:List[Dict[str,Any]]) -> str:
         parts=[]
@@ -380,15 +607,15 @@ class MainWindow(QtWidgets.QMainWindow):
             parts.append(line + ("\n"+ips if ips else ""))
         return "\n".join(parts)
 
-    def btn_kill(self, pid:int) -> QtWidgets.QWidget:
+    def btn_kill(self) -> QtWidgets.QPushButton:
+        # pid is read from the button's "pid" property at click time, so pooled buttons never rewire
         btn=QtWidgets.QPushButton("Kill")
-        btn.setEnabled(self.chkKill.isChecked() and pid is not None)
-        btn.clicked.connect(lambda: self.kill_tree(pid))
+        btn.clicked.connect(lambda: self.kill_tree(btn.property("pid")))
         return btn
 
-    def btn_detail(self, pid:int) -> QtWidgets.QWidget:
+    def btn_detail(self) -> QtWidgets.QPushButton:
         b=QtWidgets.QPushButton("Detail")
-        b.clicked.connect(lambda: PidDetailDialog(pid, self).exec())
+        b.clicked.connect(lambda: PidDetailDialog(b.property("pid"), self).exec())
         return b
 
     def kill_tree(self, pid:int):
@@ -417,84 +644,113 @@ class MainWindow(QtWidgets.QMainWindow):
 
     # ---------- export ----------
     def export_json(self):
-        snap=snapshot(do_geo=self.chkGeo.isChecked())
+        # exports wait for pending Geo lookups so the file isn't full of "geo": null
+        snap=snapshot(do_geo=self.chkGeo.isChecked(), geo_wait=GEO_EXPORT_WAIT)
         path,_=QtWidgets.QFileDialog.getSaveFileName(self,"Export JSON",f"snapshot_{int(time.time())}.json","JSON (*.json)")
         if not path: return
         try:
-            with open(path,"w",encoding="utf-8") as f:
-                json.dump(snap,f,ensure_ascii=False,indent=2)
+            with open(path,"wb") as f:
+                f.write(dumps_json(snap))
             QtWidgets.QMessageBox.information(self,"Export",f"Saved: {path}")
         except Exception as e:
             QtWidgets.QMessageBox.critical(self,"Export error",str(e))
 
     def export_csv(self):
-        snap=snapshot(do_geo=self.chkGeo.isChecked()); conns=snap.get("connections",[])
         path,_=QtWidgets.QFileDialog.getSaveFileName(self,"Export CSV",f"connections_{int(time.time())}.csv","CSV (*.csv)")
         if not path: return
         try:
-            import csv
-            with open(path,"w",newline="",encoding="utf-8") as f:
-                w=csv.writer(f); w.writerow(["proto","local","remote","state","process","pid"])
-                for c in conns: w.writerow([c.get("proto"),c.get("local"),c.get("remote"),c.get("state"),c.get("process"),c.get("pid")])
+            stream_conns_csv(path)
             QtWidgets.QMessageBox.information(self,"Export",f"Saved: {path}")
         except Exception as e:
             QtWidgets.QMessageBox.critical(self,"Export error",str(e))
 
     # ---------- main refresh ----------
     def refresh(self):
-        snap=snapshot(do_geo=self.chkGeo.isChecked())
+        # skip if a snapshot is still running or the last one is younger than _min_interval
+        if self._busy or time.monotonic()-self._last_snap_ts < self._min_interval: return
+        self._busy=True; self._last_snap_ts=time.monotonic()
+        self._task=SnapshotTask(self.chkGeo.isChecked())
+        self._task.signals.done.connect(self._apply_snapshot)
+        QtCore.QThreadPool.globalInstance().start(self._task)
+
+    @QtCore.Slot(object)
+    def _apply_snapshot(self, snap:Dict[str,Any]):
+        self._busy=False; self._task=None
+        if not snap: return
         r=snap["resources"]
         # charts
-        self.cCpu.push(r.get("cpu_percent") or 0.0)
-        self.cMem.push(r.get("memory_percent") or 0.0)
+        self.cCpu.set_data(r.get("cpu_percent") or 0.0)
+        self.cMem.set_data(r.get("memory_percent") or 0.0)
         tx=((r.get("net_io") or {}).get("bytes_sent") or 0)
         rx=((r.get("net_io") or {}).get("bytes_recv") or 0)
-        self.cTx.push(max(0, tx - getattr(self,"last_tx",0)))
-        self.cRx.push(max(0, rx - getattr(self,"last_rx",0)))
+        self.cTx.set_data(max(0, tx - getattr(self,"last_tx",0)))
+        self.cRx.set_data(max(0, rx - getattr(self,"last_rx",0)))
+        # one paint pass for all four charts after every buffer is updated
+        for ch in (self.cCpu, self.cMem, self.cTx, self.cRx): ch.flush()
         self.last_tx, self.last_rx = tx, rx
         # ifaces
-        self.ifaces.setPlainText(self.iface_text(snap["interfaces"]))
-
+        ifs=snap["interfaces"]
+        sig=tuple((i.get('name'), i.get('is_up'), i.get('speed_mbps'),
+                   tuple((ip['family'], ip['address'], ip.get('netmask')) for ip in (i.get('ips') or []))) for i in ifs)
+        if sig!=self._ifaces_sig:
+            # only re-set the text when NICs actually changed: keeps scroll/selection, skips relayout
+            self.ifaces.setPlainText(self.iface_text(ifs)); self._ifaces_sig=sig
+        self._last_snap=snap
+        self.render_tables(snap)
+
+    def refilter(self):
+        """Filter changed -> re-filter the last snapshot instead of collecting a new one."""
+        if self._last_snap: self.render_tables(self._last_snap)
+
+    def render_tables(self, snap:Dict[str,Any]):
         # filters
         q=(self.qSearch.text() or "").lower()
         st=self.qState.currentText().strip()
         proc_q=(self.qProc.text() or "").lower()
         port_q=(self.qPort.text() or "").strip()
+        has_geo=self.chkGeo.isChecked()
+
+        # parse the port filter once: exact port -> (v,v), invalid text -> empty range
+        port_lo=port_hi=0
+        if port_q:
+            try:
+                if "-" in port_q: port_lo,port_hi=map(int, port_q.split("-",1))
+                else: port_lo=port_hi=int(port_q)
+            except Exception: port_lo,port_hi=1,0
 
         def port_match(s:str)->bool:
-            if not port_q: return True
             if not s: return False
-            m=s.rsplit(":",1)
-            if len(m)!=2: return False
-            try: v=int(m[1])
-            except Exception: return False
-            if "-" in port_q:
-                try:
-                    a,b=map(int, port_q.split("-",1))
-                    return a<=v<=b
-                except Exception: return False
-            try: return v==int(port_q)
+            try: v=int(s.rsplit(":",1)[1])
             except Exception: return False
+            return port_lo<=v<=port_hi
 
         # top
-        rows=[]
+        rows=[]; pids=[]
         for p in snap["top"]:
-            rows.append([p.get("pid"),p.get("name") or "",p.get("conns") or 0,(p.get("cmd") or "")[:160], self.btn_kill(p.get("pid")), self.btn_detail(p.get("pid"))])
-        self.set_table(self.tblTop, rows)
+            pid=p.get("pid")
+            rows.append([pid,p.get("name") or "",p.get("conns") or 0,(p.get("cmd") or "")[:160]])
+            pids.append(pid)
+        self.set_table(self.tblTop, rows, pids)
 
         # connections
-        rows=[]
+        rows=[]; pids=[]
         for c in snap["connections"]:
             if st and c.get("state")!=st: continue
             if proc_q and proc_q not in (c.get("process") or "").lower(): continue
             if port_q and not (port_match(c.get("local","")) or port_match(c.get("remote",""))): continue
-            sline=f"{c.get('proto')} {c.get('local')} {c.get('remote') or ''} {c.get('state') or ''} {c.get('pid') or ''} {(c.get('process') or '').lower()}"
-            if q and q not in sline.lower(): continue
+            if q:
+                sline=f"{c.get('proto')} {c.get('local')} {c.get('remote') or ''} {c.get('state') or ''} {c.get('pid') or ''} {c.get('process') or ''}"
+                if q not in sline.lower(): continue
             geo=""
-            g=c.get("geo")
-            if g: geo=f"{g.get('city') or ''} {g.get('regionName') or ''} {g.get('country') or ''} • {g.get('isp') or g.get('org') or ''}".strip()
-            rows.append([c.get("proto"),c.get("local"),c.get("remote") or "",c.get("state") or "",c.get("process") or "",c.get("pid") or "",geo,self.btn_kill(c.get("pid") or 0), self.btn_detail(c.get("pid") or 0)])
-        self.set_table(self.tblConn, rows)
+            g=c.get("geo") if has_geo else None
+            if g is not None:
+                city=g.get('city') or ''; region=g.get('regionName') or ''; country=g.get('country') or ''
+                isp=g.get('isp') or g.get('org') or ''
+                geo=f"{city} {region} {country} • {isp}".strip()
+            pid=c.get("pid") or 0
+            rows.append([c.get("proto"),c.get("local"),c.get("remote") or "",c.get("state") or "",c.get("process") or "",c.get("pid") or "",geo])
+            pids.append(pid)
+        self.set_table(self.tblConn, rows, pids)
 
 # ------------- entry -------------
 def main():
@@ -7,33 +7,33 @@ Tính năng:
 • Alias: đặt tên profile theo ý (cột “Alias”, nút Rename / Set Alias)
 • Restart Selected (Terminate → Open lại)
 • Giới hạn số tiến trình mở song song (Max parallel) khi Open All
-• Identify Accounts: cố gắng lấy tên từ window title (cần pywin32), nếu không rõ thì hỏi nhập tay rồi lưu alias
+• Identify Accounts: cố gắng lấy tên từ window title (user32 qua ctypes), nếu không rõ thì hỏi nhập tay rồi lưu alias
 • Quét psutil 1 lần/chu kỳ + update incremental → mượt
 • Chỉnh Interval 0.5–10s, Auto refresh
 
 Cài đặt:
   pip install psutil
-  # tự động nhận tên (không bắt buộc):
-  pip install pywin32
+  # nhận sự kiện mở/tắt tiến trình qua WMI thay vì quét liên tục (không bắt buộc):
+  pip install wmi
 
 Chạy:  py telegram_manager.py
 """
 from __future__ import annotations
-import os, json, time, threading, subprocess, queue, re
-from dataclasses import dataclass
-from typing import List, Optional, Dict
+import os, json, time, threading, subprocess, re, bisect, ctypes, functools
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Iterator, Tuple
 
 try:
     import psutil  # type: ignore
 except Exception:
     psutil = None
 
-# PyWin32 (tùy chọn để đọc window title theo PID)
+# WMI (tùy chọn): nhận sự kiện start/stop tiến trình, khi có thì quét toàn bộ chỉ để đối soát
 try:
-    import win32gui, win32process  # type: ignore
+    import wmi, pythoncom  # type: ignore
 except Exception:
-    win32gui = None
-    win32process = None
+    wmi = None
+    pythoncom = None
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
@@ -41,6 +41,7 @@ from tkinter import ttk, filedialog, messagebox, simpledialog
 APP_TITLE   = "Telegram Manager – Optimized + Custom"
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "telegram_manager.json")
 EXECUTABLE_CANDIDATES = ["Telegram.exe", "Telegram Desktop.exe", "TelegramPortable.exe"]
+RECONCILE_INTERVAL = 30.0  # giây giữa 2 lần quét đầy đủ khi đang nhận sự kiện WMI
 
 @dataclass
 class Profile:
@@ -48,10 +49,18 @@ class Profile:
     folder: str
     exe: str
     pid: Optional[int] = None
+    folder_key: str = field(default="", init=False)   # normpath(folder), tính 1 lần khi tạo
+    exe_key: str = field(default="", init=False)      # normpath(exe)
+
+    def __post_init__(self):
+        self.folder_key = normpath(self.folder)
+        self.exe_key = normpath(self.exe)
 
 # ─────────────────────────── Helpers ───────────────────────────
 
+@functools.lru_cache(maxsize=4096)
 def normpath(p: str) -> str:
+    # gọi lặp lại với cùng folder/exe mỗi lần quét; app không chdir nên kết quả ổn định trong phiên
     return os.path.normcase(os.path.abspath(p))
 
 def load_config() -> dict:
@@ -63,43 +72,74 @@ def load_config() -> dict:
             return {}
     return {}
 
+_last_saved: Optional[str] = None
+
 def save_config(cfg: dict) -> None:
+    # bỏ qua nếu nội dung không đổi; ghi ra .tmp rồi os.replace để file không bao giờ bị ghi dở
+    global _last_saved
     try:
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(cfg, f, ensure_ascii=False, indent=2)
+        text = json.dumps(cfg, ensure_ascii=False, indent=2)
+        if text == _last_saved:
+            return
+        tmp = CONFIG_FILE + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, CONFIG_FILE)
+        _last_saved = text
     except Exception:
         pass
 
 def ask_base_folder() -> Optional[str]:
     return filedialog.askdirectory(title="Chọn thư mục gốc chứa 'Telegram 1', 'Telegram 2', ...") or None
 
+_EXE_RANK = {n.lower(): i for i, n in enumerate(EXECUTABLE_CANDIDATES)}
+
 def find_exe_in_folder(folder: str) -> Optional[str]:
-    for name in EXECUTABLE_CANDIDATES:
-        path = os.path.join(folder, name)
-        if os.path.isfile(path):
-            return path
-    # tìm 1 cấp con
+    # 1 lượt scandir: ưu tiên theo thứ tự EXECUTABLE_CANDIDATES, không có thì lấy telegram*.exe đầu tiên
+    best: Optional[str] = None
+    best_rank = len(EXECUTABLE_CANDIDATES)
+    fallback: Optional[str] = None
     try:
-        for root, _, files in os.walk(folder):
-            for fn in files:
-                if fn.lower().startswith("telegram") and fn.lower().endswith(".exe"):
-                    return os.path.join(root, fn)
-            break
-    except Exception:
+        with os.scandir(folder) as it:
+            for entry in it:
+                n = entry.name.lower()
+                if not (n.startswith("telegram") and n.endswith(".exe")):
+                    continue
+                if not entry.is_file():
+                    continue
+                rank = _EXE_RANK.get(n)
+                if rank == 0:
+                    return entry.path
+                if rank is not None and rank < best_rank:
+                    best, best_rank = entry.path, rank
+                elif fallback is None:
+                    fallback = entry.path
+    except OSError:
         pass
-    return None
+    return best or fallback
+
+SCAN_PARALLEL_MIN = 8  # từ chừng này thư mục trở lên thì quét exe song song
 
 def scan_profiles(base_folder: str) -> List[Profile]:
     profiles: List[Profile] = []
     try:
         def sort_key(s: str):
-            m = re.search(r"(\d+)$", s)
-            return (int(m.group(1)) if m else 999999, s)
-        for name in sorted(os.listdir(base_folder), key=sort_key):
-            p = os.path.join(base_folder, name)
-            if not os.path.isdir(p):
-                continue
-            exe = find_exe_in_folder(p)
+            # số đuôi tên thư mục ("Profile 12" -> 12); isdecimal = \d của re, kể cả chữ số Unicode
+            i = len(s)
+            while i and s[i - 1].isdecimal():
+                i -= 1
+            return (int(s[i:]) if i < len(s) else 999999, s)
+        dirs = [(name, os.path.join(base_folder, name)) for name in sorted(os.listdir(base_folder), key=sort_key)]
+        dirs = [(name, p) for name, p in dirs if os.path.isdir(p)]
+        folders = [p for _, p in dirs]
+        if len(folders) >= SCAN_PARALLEL_MIN:
+            # nhiều profile / ổ mạng: chồng I/O scandir của các thư mục lên nhau
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=8) as ex:
+                exes = list(ex.map(find_exe_in_folder, folders))
+        else:
+            exes = [find_exe_in_folder(p) for p in folders]
+        for (name, p), exe in zip(dirs, exes):
             if exe:
                 profiles.append(Profile(name=name, folder=p, exe=exe, pid=None))
     except Exception:
@@ -108,24 +148,143 @@ def scan_profiles(base_folder: str) -> List[Profile]:
 
 # ─────────────────────────── Process Snapshot (1 lần/chu kỳ) ───────────────────────────
 
-def build_pid_snapshot(profiles: List[Profile]) -> Dict[str, Optional[int]]:
-    result: Dict[str, Optional[int]] = {p.name: None for p in profiles}
-    if psutil is None:
-        return result
+@dataclass
+class ProfileIndex:
+    """Chỉ mục tra cứu exe/cwd → Profile, dựng 1 lần mỗi lần (re)scan thay vì mỗi chu kỳ quét."""
+    profiles: List[Profile]
+    by_exe: Dict[str, List[Profile]]
+    by_cwd: Dict[str, List[Profile]]
+    prefix_keys: List[str]
+    prefix_profiles: List[Profile]
+
+def index_profiles(profiles: List[Profile]) -> ProfileIndex:
     by_exe: Dict[str, List[Profile]] = {}
     by_cwd: Dict[str, List[Profile]] = {}
     for p in profiles:
-        by_exe.setdefault(normpath(p.exe), []).append(p)
-        by_cwd.setdefault(normpath(p.folder), []).append(p)
+        by_exe.setdefault(p.exe_key, []).append(p)
+        by_cwd.setdefault(p.folder_key, []).append(p)
+    # fallback "exe nằm trong thư mục profile": key kèm os.sep, sort 1 lần rồi bisect -> O(log M)/tiến trình.
+    # Các profile là thư mục anh em (không lồng nhau) nên key lớn nhất <= exen là ứng viên duy nhất.
+    prefixes = sorted(((p.folder_key.rstrip(os.sep) + os.sep, p) for p in profiles), key=lambda t: t[0])
+    return ProfileIndex(profiles, by_exe, by_cwd, [k for k, _ in prefixes], [p for _, p in prefixes])
+
+# Windows: đọc cả bảng tiến trình bằng 1 lời gọi NtQuerySystemInformation(SystemProcessInformation),
+# tên image có sẵn trong bản ghi -> chỉ mở handle cho tiến trình Telegram. Lỗi/không phải Windows -> psutil.
+SYSTEM_PROCESS_INFORMATION = 5
+STATUS_INFO_LENGTH_MISMATCH = 0xC0000004
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+class _UNICODE_STRING(ctypes.Structure):
+    _fields_ = [("Length", ctypes.c_ushort), ("MaximumLength", ctypes.c_ushort), ("Buffer", ctypes.c_void_p)]
+
+class _SYSTEM_PROCESS_INFORMATION(ctypes.Structure):
+    # chỉ phần đầu của struct, đủ tới UniqueProcessId
+    _fields_ = [
+        ("NextEntryOffset", ctypes.c_uint32), ("NumberOfThreads", ctypes.c_uint32),
+        ("WorkingSetPrivateSize", ctypes.c_longlong), ("HardFaultCount", ctypes.c_uint32),
+        ("NumberOfThreadsHighWatermark", ctypes.c_uint32), ("CycleTime", ctypes.c_ulonglong),
+        ("CreateTime", ctypes.c_longlong), ("UserTime", ctypes.c_longlong), ("KernelTime", ctypes.c_longlong),
+        ("ImageName", _UNICODE_STRING), ("BasePriority", ctypes.c_int32), ("UniqueProcessId", ctypes.c_void_p),
+    ]
+
+_nt_api = None  # (NtQuerySystemInformation, OpenProcess, QueryFullProcessImageNameW, CloseHandle) | False
+
+def _load_nt_api():
+    global _nt_api
+    if _nt_api is None:
+        try:
+            from ctypes import wintypes
+            ntdll, k32 = ctypes.windll.ntdll, ctypes.windll.kernel32  # type: ignore[attr-defined]
+            ntq = ntdll.NtQuerySystemInformation
+            ntq.argtypes = [ctypes.c_ulong, ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong)]
+            ntq.restype = ctypes.c_long
+            k32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+            k32.OpenProcess.restype = wintypes.HANDLE
+            k32.QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR, ctypes.POINTER(wintypes.DWORD)]
+            k32.QueryFullProcessImageNameW.restype = wintypes.BOOL
+            k32.CloseHandle.argtypes = [wintypes.HANDLE]
+            _nt_api = (ntq, k32.OpenProcess, k32.QueryFullProcessImageNameW, k32.CloseHandle)
+        except Exception:
+            _nt_api = False
+    return _nt_api
+
+def _nt_image_path(api, pid: int) -> Optional[str]:
+    _, open_process, query_name, close_handle = api
+    h = open_process(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not h:
+        return None
+    try:
+        size = ctypes.c_ulong(1024)
+        buf = ctypes.create_unicode_buffer(size.value)
+        return buf.value if query_name(h, 0, buf, ctypes.byref(size)) else None
+    finally:
+        close_handle(h)
+
+def nt_telegram_procs() -> Optional[List[Tuple[int, Optional[str]]]]:
+    """[(pid, exe)] của tiến trình có image name chứa 'telegram'; None nếu API không dùng được."""
+    api = _load_nt_api()
+    if not api:
+        return None
+    ntq = api[0]
+    size = 1 << 20
     try:
-        for proc in psutil.process_iter(["pid","name","exe","cwd"]):
-            info = proc.info
-            name = (info.get("name") or "").lower()
-            if "telegram" not in name:
+        while True:
+            buf = ctypes.create_string_buffer(size)
+            ret = ctypes.c_ulong(0)
+            status = ntq(SYSTEM_PROCESS_INFORMATION, buf, size, ctypes.byref(ret)) & 0xFFFFFFFF
+            if status == STATUS_INFO_LENGTH_MISMATCH:
+                size = max(size * 2, ret.value + 65536)
                 continue
-            exen = normpath(info.get("exe") or ".") if info.get("exe") else ""
-            cwdn = normpath(info.get("cwd") or ".") if info.get("cwd") else ""
-            pid = int(info["pid"]) if info.get("pid") else None
+            if status != 0:
+                return None
+            break
+        out: List[Tuple[int, Optional[str]]] = []
+        offset = 0
+        while True:
+            info = _SYSTEM_PROCESS_INFORMATION.from_buffer(buf, offset)
+            img = info.ImageName
+            if img.Buffer and "telegram" in ctypes.wstring_at(img.Buffer, img.Length // 2).lower():
+                pid = info.UniqueProcessId or 0
+                out.append((pid, _nt_image_path(api, pid)))
+            if not info.NextEntryOffset:
+                break
+            offset += info.NextEntryOffset
+        return out
+    except Exception:
+        return None
+
+def _iter_telegram_procs() -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+    """(pid, exe, cwd) cho từng tiến trình Telegram: NT API nếu có, không thì psutil."""
+    nt = nt_telegram_procs()
+    if nt is not None:
+        for pid, exe in nt:
+            yield pid, exe, None  # cwd không có trong bảng NT; exe + prefix thư mục là đủ để khớp
+        return
+    if psutil is None:
+        return
+    # chỉ xin "name" (pid đã có sẵn trên Process), exe/cwd đọc muộn bên dưới
+    for proc in psutil.process_iter(["name"]):
+        name = (proc.info.get("name") or "").lower()
+        if "telegram" not in name:
+            continue
+        # exe/cwd chỉ lấy cho tiến trình Telegram, gom trong 1 oneshot
+        exe = cwd = None
+        with proc.oneshot():
+            try: exe = proc.exe()
+            except psutil.Error: pass
+            try: cwd = proc.cwd()
+            except psutil.Error: pass
+        yield proc.pid, exe, cwd
+
+def build_pid_snapshot(profiles: List[Profile], index: Optional[ProfileIndex] = None) -> Dict[str, Optional[int]]:
+    if index is None:
+        index = index_profiles(profiles)
+    result: Dict[str, Optional[int]] = {p.name: None for p in index.profiles}
+    by_exe, by_cwd, prefix_keys = index.by_exe, index.by_cwd, index.prefix_keys
+    try:
+        for pid, exe, cwd in _iter_telegram_procs():
+            exen = normpath(exe) if exe else ""
+            cwdn = normpath(cwd) if cwd else ""
             if exen and exen in by_exe:
                 for prof in by_exe[exen]:
                     if result[prof.name] is None:
@@ -135,18 +294,66 @@ def build_pid_snapshot(profiles: List[Profile]) -> Dict[str, Optional[int]]:
                     if result[prof.name] is None:
                         result[prof.name] = pid
             if exen:
-                for prof in profiles:
-                    if result[prof.name] is None and exen.startswith(normpath(prof.folder)):
+                i = bisect.bisect_right(prefix_keys, exen) - 1
+                if i >= 0 and exen.startswith(prefix_keys[i]):
+                    prof = index.prefix_profiles[i]
+                    if result[prof.name] is None:
                         result[prof.name] = pid
-                        break
     except Exception:
         pass
     return result
 
+def profile_for_exe(index: ProfileIndex, exen: str) -> Optional[Profile]:
+    """Profile ứng với 1 đường dẫn exe đã normpath (khớp exe trước, rồi tới thư mục chứa)."""
+    cands = index.by_exe.get(exen)
+    if cands:
+        return next((p for p in cands if not p.pid), cands[0])
+    i = bisect.bisect_right(index.prefix_keys, exen) - 1
+    if i >= 0 and exen.startswith(index.prefix_keys[i]):
+        return index.prefix_profiles[i]
+    return None
+
+def exe_for_pid(pid: int) -> Optional[str]:
+    api = _load_nt_api()
+    if api:
+        exe = _nt_image_path(api, pid)
+        if exe:
+            return exe
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).exe()
+        except psutil.Error:
+            pass
+    return None
+
+# Sự kiện ETW do kernel đẩy tới -> không tốn gì khi không có tiến trình mở/tắt (cần quyền admin).
+# Là extrinsic event: phải watch theo wmi_class để wmi không đọc TargetInstance; lọc tên ở Python.
+_WMI_TRACE_CLASSES = ("Win32_ProcessStartTrace", "Win32_ProcessStopTrace")
+# Không đủ quyền: sự kiện intrinsic, chỉ creation/deletion (modification của Win32_Process bắn liên tục)
+_WQL_INSTANCE = ("SELECT * FROM __InstanceCreationEvent WITHIN 1 "
+                 "WHERE TargetInstance ISA 'Win32_Process' AND TargetInstance.Name LIKE '%telegram%'",
+                 "SELECT * FROM __InstanceDeletionEvent WITHIN 1 "
+                 "WHERE TargetInstance ISA 'Win32_Process' AND TargetInstance.Name LIKE '%telegram%'")
+WMI_MAX_ERRORS = 5  # lỗi liên tiếp khi đọc sự kiện -> bỏ WMI, quay về quét theo Interval
+
 # ─────────────────────────── Open/Kill/Restart ───────────────────────────
 
 DETACHED_PROCESS = 0x00000008
 CREATE_NEW_PROCESS_GROUP = 0x00000200
+CREATE_NO_WINDOW = 0x08000000  # taskkill là app console: không bật cửa sổ đen
+
+def _taskkill(pids: List[int], force: bool):
+    """Fallback không có psutil. /F chạy chờ xong; /T chỉ gửi yêu cầu đóng, không chờ, không pipe stdio."""
+    args = ["taskkill"]
+    for pid in pids:
+        args += ["/PID", str(pid)]
+    if force:
+        args.append("/F")
+        subprocess.run(args, capture_output=True, creationflags=CREATE_NO_WINDOW)
+    else:
+        args.append("/T")
+        subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         creationflags=CREATE_NO_WINDOW)
 
 def open_profile(profile: Profile) -> tuple[bool, str]:
     if not os.path.isfile(profile.exe):
@@ -163,7 +370,7 @@ def open_profile(profile: Profile) -> tuple[bool, str]:
 def kill_profile_by_pid(pid: int, force: bool=False) -> tuple[bool, str]:
     if psutil is None:
         try:
-            subprocess.run(["taskkill","/PID", str(pid), "/F" if force else "/T"], capture_output=True)
+            _taskkill([pid], force)
             return True, "Đã taskkill"
         except Exception as e:
             return False, f"Kill lỗi: {e}"
@@ -182,33 +389,118 @@ def kill_profile_by_pid(pid: int, force: bool=False) -> tuple[bool, str]:
     except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
         return False, f"Kill lỗi: {e}"
 
+def kill_profiles_bulk(pids: List[int], force: bool=False) -> Dict[int, tuple[bool, str]]:
+    """Kill nhiều PID cùng lúc: gửi terminate cho tất cả rồi chờ chung 1 lần (thay vì chờ tuần tự)."""
+    if not pids:
+        return {}
+    if psutil is None:
+        try:
+            _taskkill(pids, force)
+            return {pid: (True, "Đã taskkill") for pid in pids}
+        except Exception as e:
+            return {pid: (False, f"Kill lỗi: {e}") for pid in pids}
+    res: Dict[int, tuple[bool, str]] = {}
+    procs = []
+    for pid in pids:
+        try:
+            p = psutil.Process(pid)
+            if force:
+                p.kill()
+            else:
+                p.terminate()
+            procs.append(p)
+        except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
+            res[pid] = (False, f"Kill lỗi: {e}")
+    gone, alive = psutil.wait_procs(procs, timeout=5 if force else 4)
+    for p in gone:
+        res[p.pid] = (True, f"Killed {p.pid}" if force else f"Terminated {p.pid}")
+    if alive:
+        for p in alive:
+            try: p.kill()
+            except psutil.Error: pass
+        gone, alive = psutil.wait_procs(alive, timeout=5)
+        for p in gone:
+            res[p.pid] = (True, f"Force killed {p.pid}")
+        for p in alive:
+            res[p.pid] = (False, f"Kill lỗi: PID {p.pid} vẫn chạy")
+    return res
+
+SYNCHRONIZE = 0x00100000
+
+def wait_pid_exit(pid: int, timeout: float=2.0) -> None:
+    """Chờ PID thoát (không cần psutil): WaitForSingleObject trên handle tiến trình, trả về ngay khi thoát."""
+    try:
+        k32 = ctypes.windll.kernel32  # type: ignore[attr-defined]
+        h = k32.OpenProcess(SYNCHRONIZE, False, pid)
+        if not h:
+            return  # không mở được handle -> tiến trình đã thoát
+        try:
+            k32.WaitForSingleObject(h, int(timeout * 1000))
+        finally:
+            k32.CloseHandle(h)
+    except Exception:
+        time.sleep(0.6)
+
 def restart_profile(profile: Profile) -> str:
     if profile.pid:
+        # nhánh psutil của kill_profile_by_pid đã chờ tiến trình thoát hẳn (wait) -> không cần sleep cố định
         kill_profile_by_pid(profile.pid)
-        time.sleep(0.6)
+        if psutil is None:
+            wait_pid_exit(profile.pid)
     ok, msg = open_profile(profile)
     return msg
 
-# ─────────────────────────── Identify account (pywin32) ───────────────────────────
+# ─────────────────────────── Identify account (user32) ───────────────────────────
 
-def get_window_titles_by_pid(pid: int) -> List[str]:
-    titles: List[str] = []
-    if not (win32gui and win32process):
-        return titles
-    def cb(hwnd, _):
+GW_HWNDNEXT = 2
+_user32 = None  # None = chưa thử, False = không dùng được
+
+def _load_user32():
+    global _user32
+    if _user32 is None:
         try:
-            _, p = win32process.GetWindowThreadProcessId(hwnd)
-            if p == pid and win32gui.IsWindowVisible(hwnd):
-                t = win32gui.GetWindowText(hwnd)
-                if t: titles.append(t)
+            from ctypes import wintypes
+            u32 = ctypes.windll.user32  # type: ignore[attr-defined]
+            u32.GetTopWindow.argtypes = [wintypes.HWND]
+            u32.GetTopWindow.restype = wintypes.HWND
+            u32.GetWindow.argtypes = [wintypes.HWND, wintypes.UINT]
+            u32.GetWindow.restype = wintypes.HWND
+            u32.IsWindowVisible.argtypes = [wintypes.HWND]
+            u32.IsWindowVisible.restype = wintypes.BOOL
+            u32.GetWindowThreadProcessId.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.DWORD)]
+            u32.GetWindowThreadProcessId.restype = wintypes.DWORD
+            u32.GetWindowTextW.argtypes = [wintypes.HWND, wintypes.LPWSTR, ctypes.c_int]
+            u32.GetWindowTextW.restype = ctypes.c_int
+            _user32 = u32
         except Exception:
-            pass
-        return True
-    try:
-        win32gui.EnumWindows(cb, None)
-    except Exception:
-        pass
-    return titles
+            _user32 = False
+    return _user32
+
+def get_window_titles_by_pid(pids=None) -> Dict[int, List[str]]:
+    """{pid: [title, ...]} của các cửa sổ top-level đang hiện; pids=None -> mọi PID.
+
+    Duyệt z-order bằng GetTopWindow/GetWindow thay cho EnumWindows: không có callback Python cho từng HWND,
+    chỉ đọc title của cửa sổ thuộc PID cần tìm.
+    """
+    out: Dict[int, List[str]] = {}
+    u32 = _load_user32()
+    if not u32:
+        return out
+    wanted = set(pids) if pids is not None else None
+    pid = ctypes.c_ulong()
+    buf = ctypes.create_unicode_buffer(512)
+    hwnd = u32.GetTopWindow(None)
+    # z-order có thể đổi trong lúc duyệt -> chặn số bước để không lặp vô hạn
+    for _ in range(100000):
+        if not hwnd:
+            break
+        if u32.IsWindowVisible(hwnd):
+            u32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if wanted is None or pid.value in wanted:
+                if u32.GetWindowTextW(hwnd, buf, len(buf)):
+                    out.setdefault(pid.value, []).append(buf.value)
+        hwnd = u32.GetWindow(hwnd, GW_HWNDNEXT)
+    return out
 
 ALIAS_HINT_RE = re.compile(r"@\w+|\b\+?\d{6,}\b", re.I)
 
@@ -221,6 +513,7 @@ class App:
         self.root.geometry("1080x600")
 
         self.cfg = load_config()
+        self._cfg_dirty = False
         self.aliases: Dict[str, str] = self.cfg.get("aliases", {})  # key = normpath(folder)
         base = self.cfg.get("base_dir")
         if not base or not os.path.isdir(base):
@@ -267,17 +560,25 @@ class App:
 
         # Data
         self.profiles: List[Profile] = scan_profiles(self.base_dir)
+        self._index: ProfileIndex = index_profiles(self.profiles)
         self.populate_table_first_time()
 
         # Background scanner
-        self.q: "queue.Queue[Dict[str, Optional[int]]]" = queue.Queue()
+        # 1 ô "snapshot mới nhất" thay cho queue: producer gộp đè, consumer lấy 1 lần/tick -> không dồn ứ
+        self._snap_lock = threading.Lock()
+        self._latest_snap: Optional[Dict[str, Optional[int]]] = None
+        self._delta_ts: Dict[str, float] = {}  # profile -> lúc nhận delta WMI gần nhất
         self.stop_flag = False
+        self.events_active = False
         threading.Thread(target=self.scanner_loop, daemon=True).start()
+        self.root.after(1000, self._config_tick)
+        if wmi is not None:
+            threading.Thread(target=self.event_loop, daemon=True).start()
         self.root.after(150, self.consume_queue)
 
     # ----- UI helpers -----
     def key_for(self, p: Profile) -> str:
-        return normpath(p.folder)
+        return p.folder_key
 
     def get_alias(self, p: Profile) -> str:
         return self.aliases.get(self.key_for(p), "")
@@ -285,7 +586,20 @@ class App:
     def set_alias(self, p: Profile, alias: str):
         self.aliases[self.key_for(p)] = alias
         self.cfg["aliases"] = self.aliases
-        save_config(self.cfg)
+        self._schedule_save()
+
+    def _schedule_save(self):
+        self._cfg_dirty = True
+
+    def _flush_config(self):
+        if self._cfg_dirty:
+            self._cfg_dirty = False
+            save_config(self.cfg)
+
+    def _config_tick(self):
+        # gom các lần đổi alias (vd. Identify cả loạt) thành tối đa 1 lần ghi/giây
+        self._flush_config()
+        self.root.after(1000, self._config_tick)
 
     def populate_table_first_time(self):
         for p in self.profiles:
@@ -301,14 +615,31 @@ class App:
         if new:
             self.base_dir = new
             self.base_lbl.config(text=new)
-            self.cfg["base_dir"] = new; save_config(self.cfg)
+            self.cfg["base_dir"] = new; self._schedule_save()
             self.rescan_profiles()
 
     def rescan_profiles(self):
-        self.profiles = scan_profiles(self.base_dir)
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        self.populate_table_first_time()
+        old = {p.name: p for p in self.profiles}
+        profiles = scan_profiles(self.base_dir)
+        # chỉ xoá/thêm dòng thay đổi thay vì dựng lại cả Treeview
+        wanted = {p.name for p in profiles}
+        for iid in self.tree.get_children():
+            if iid not in wanted:
+                self.tree.delete(iid)
+        for i, p in enumerate(profiles):
+            prev = old.get(p.name)
+            if prev is not None and prev.folder_key == p.folder_key and self.tree.exists(p.name):
+                p.pid = prev.pid  # cùng profile: giữ trạng thái đang hiển thị
+                if prev.exe != p.exe:
+                    self.tree.set(p.name, "exe", p.exe)
+                continue
+            vals = (self.get_alias(p), p.name, "?", "", p.exe, p.folder)
+            if self.tree.exists(p.name):
+                self.tree.item(p.name, values=vals)  # cùng tên nhưng thư mục khác (đổi base)
+            else:
+                self.tree.insert("", i, iid=p.name, values=vals)
+        self.profiles = profiles
+        self._index = index_profiles(profiles)
         self.log_write(f"Đã quét {len(self.profiles)} profile.")
 
     # ----- selections -----
@@ -330,10 +661,7 @@ class App:
             return
         if not messagebox.askyesno("Xác nhận", f"Kill {len(items)} profile?"):
             return
-        for p in items:
-            if p.pid:
-                ok, msg = kill_profile_by_pid(p.pid)
-                self.log_write(f"[{p.name}] {msg}")
+        self.kill_profiles([p for p in items if p.pid])
 
     def restart_selected(self):
         items = self.get_selected()
@@ -361,10 +689,13 @@ class App:
             return
         if not messagebox.askyesno("Xác nhận", f"Kill tất cả {len(self.profiles)} profile?"):
             return
-        for p in self.profiles:
-            if p.pid:
-                ok, msg = kill_profile_by_pid(p.pid)
-                self.log_write(f"[{p.name}] {msg}")
+        self.kill_profiles([p for p in self.profiles if p.pid])
+
+    def kill_profiles(self, items: List[Profile]):
+        results = kill_profiles_bulk([p.pid for p in items])
+        for p in items:
+            ok, msg = results.get(p.pid, (False, "Kill lỗi"))
+            self.log_write(f"[{p.name}] {msg}")
 
     def toggle_selected(self, event=None):
         item = self.tree.identify_row(event.y) if event else None
@@ -395,19 +726,24 @@ class App:
         items = self.get_selected() or self.profiles
         if not items:
             return
-        if not (win32gui and win32process):
-            messagebox.showwarning("Thiếu pywin32", "Tự động nhận tên cần 'pip install pywin32'. Sẽ hỏi nhập tay.")
+        if not _load_user32():
+            messagebox.showwarning("Không đọc được cửa sổ", "Tự động nhận tên chỉ chạy trên Windows. Sẽ hỏi nhập tay.")
+        # mở song song mọi profile chưa chạy, chờ 1 lần, 1 lần snapshot cho tất cả
+        probe = [p for p in items if not p.pid]
+        if probe:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=max(1, int(self.max_parallel.get()))) as ex:
+                list(ex.map(open_profile, probe))
+            time.sleep(1.2)
+            snap = build_pid_snapshot(probe)
+            for p in probe:
+                p.pid = snap.get(p.name)
+        titles_by_pid = get_window_titles_by_pid([p.pid for p in items if p.pid])  # 1 lượt duyệt cửa sổ cho cả lượt
         for p in items:
             suggested = None
             if p.pid:
-                titles = get_window_titles_by_pid(p.pid)
+                titles = titles_by_pid.get(p.pid, [])
                 suggested = next((t for t in titles if ALIAS_HINT_RE.search(t)), None) or (titles[0] if titles else None)
-            if not suggested:
-                if not p.pid:
-                    open_profile(p); time.sleep(1.2)
-                    snap = build_pid_snapshot([p]); p.pid = snap.get(p.name)
-                    titles = get_window_titles_by_pid(p.pid) if p.pid else []
-                    suggested = next((t for t in titles if ALIAS_HINT_RE.search(t)), None) or (titles[0] if titles else None)
             if not suggested:
                 suggested = self.get_alias(p) or p.name
             alias = simpledialog.askstring("Identify", f"Tên tài khoản cho {p.name}", initialvalue=suggested)
@@ -417,33 +753,118 @@ class App:
                 self.log_write(f"[{p.name}] alias = {alias.strip()}")
 
     # ----- background scanner -----
+    def build_pid_snapshot(self) -> Dict[str, Optional[int]]:
+        idx = self._index  # đọc 1 lần: rescan có thể thay _index từ GUI thread
+        return build_pid_snapshot(idx.profiles, idx)
+
     def scanner_loop(self):
+        last_scan = 0.0
+        was_auto = True
         while not self.stop_flag:
-            if self.auto_var.get():
-                snap = build_pid_snapshot(self.profiles)
-                try:
-                    self.q.put_nowait(snap)
-                except queue.Full:
-                    pass
+            auto = bool(self.auto_var.get())
+            # có sự kiện WMI -> chỉ quét đầy đủ mỗi RECONCILE_INTERVAL để đối soát; vừa bật lại Auto -> quét ngay
+            due = not self.events_active or not was_auto or time.monotonic() - last_scan >= RECONCILE_INTERVAL
+            was_auto = auto
+            if auto and due:
+                last_scan = time.monotonic()
+                self.publish_snapshot(self.build_pid_snapshot(), started=last_scan)
             time.sleep(max(0.2, float(self.interval.get())))
 
-    def consume_queue(self):
+    def event_loop(self):
+        """Nhận sự kiện mở/tắt tiến trình Telegram từ WMI, đẩy delta {profile: pid} qua publish_snapshot."""
         try:
-            while True:
-                snap = self.q.get_nowait()
-                for p in self.profiles:
-                    new_pid = snap.get(p.name)
-                    if p.pid != new_pid:
-                        p.pid = new_pid
-                        self.tree.set(p.name, "pid", p.pid or "")
-                        self.tree.set(p.name, "status", "RUNNING" if p.pid else "STOPPED")
-                        self.tree.set(p.name, "alias", self.get_alias(p))
-        except queue.Empty:
+            pythoncom.CoInitialize()
+        except Exception:
+            return
+        watchers = None
+        try:
+            conn = wmi.WMI()
+            try:
+                start_cls, stop_cls = _WMI_TRACE_CLASSES
+                watchers = (("start", conn.watch_for(wmi_class=start_cls), "ProcessID", "ProcessName"),
+                            ("stop", conn.watch_for(wmi_class=stop_cls), "ProcessID", "ProcessName"))
+            except Exception:
+                q_start, q_stop = _WQL_INSTANCE
+                watchers = (("start", conn.watch_for(raw_wql=q_start), "ProcessId", "Name"),
+                            ("stop", conn.watch_for(raw_wql=q_stop), "ProcessId", "Name"))
+        except Exception:
+            watchers = None
+        if not watchers:
+            pythoncom.CoUninitialize()
+            return  # không có WMI -> scanner_loop tiếp tục quét theo Interval
+        self.events_active = True
+        live: Dict[int, str] = {}  # pid -> profile, chỉ thread này ghi: không phụ thuộc p.pid của GUI
+        errors = 0
+        try:
+            while not self.stop_flag and errors < WMI_MAX_ERRORS:
+                for kind, watcher, pid_attr, name_attr in watchers:
+                    try:
+                        ev = watcher(timeout_ms=500)
+                    except wmi.x_wmi_timed_out:
+                        continue
+                    except Exception:
+                        errors += 1
+                        continue
+                    errors = 0
+                    try:
+                        if "telegram" not in (getattr(ev, name_attr) or "").lower():
+                            continue
+                        delta = self._process_event_delta(kind, int(getattr(ev, pid_attr)), live)
+                    except Exception:
+                        continue  # 1 sự kiện hỏng không làm mất cả subscription
+                    if delta and self.auto_var.get():  # tắt Auto refresh thì không cập nhật bảng, như trước
+                        self.publish_snapshot(delta)
+        except Exception:
             pass
+        finally:
+            self.events_active = False
+            pythoncom.CoUninitialize()
+
+    def _process_event_delta(self, kind: str, pid: int, live: Dict[int, str]) -> Optional[Dict[str, Optional[int]]]:
+        if kind == "start":
+            exe = exe_for_pid(pid)
+            prof = profile_for_exe(self._index, normpath(exe)) if exe else None
+            if not prof:
+                return None
+            live[pid] = prof.name
+            return {prof.name: pid}
+        name = live.pop(pid, None)
+        names = [name] if name else [p.name for p in self.profiles if p.pid == pid]
+        return {n: None for n in names} or None
+
+    def publish_snapshot(self, snap: Dict[str, Optional[int]], started: Optional[float] = None):
+        """started=None: delta từ event_loop; có started: snapshot đầy đủ bắt đầu quét lúc started (monotonic)."""
+        with self._snap_lock:
+            if started is None:
+                now = time.monotonic()
+                for name in snap:
+                    self._delta_ts[name] = now
+            else:
+                # bỏ phần của snapshot cũ hơn delta đã nhận, không để quét chậm đè PID mới
+                snap = {n: pid for n, pid in snap.items() if self._delta_ts.get(n, 0.0) < started}
+            if self._latest_snap is None:
+                self._latest_snap = dict(snap)
+            else:
+                self._latest_snap.update(snap)
+
+    def consume_queue(self):
+        with self._snap_lock:
+            snap, self._latest_snap = self._latest_snap, None
+        if snap:
+            for p in self.profiles:
+                if p.name not in snap:  # delta từ event_loop chỉ chứa profile thay đổi
+                    continue
+                new_pid = snap[p.name]
+                if p.pid != new_pid:
+                    p.pid = new_pid
+                    # 1 lệnh Tcl cho cả dòng thay vì 3 lần .set
+                    self.tree.item(p.name, values=(self.get_alias(p), p.name, "RUNNING" if p.pid else "STOPPED",
+                                                   p.pid or "", p.exe, p.folder))
         self.root.after(150, self.consume_queue)
 
     def on_close(self):
         self.stop_flag = True
+        self._flush_config()
         self.root.destroy()
 
 # ─────────────────────────── main ───────────────────────────